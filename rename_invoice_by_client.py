@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import hashlib
+import io
 import os
 import re
 import sys
-import glob
+import shelve
 import shutil
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, List
+from typing import Callable, Deque, Optional, Dict, Iterator, List, MutableMapping, Sequence, Set, Tuple
 
 from dotenv import load_dotenv
 from unidecode import unidecode
@@ -15,6 +21,8 @@ from unidecode import unidecode
 # ====================== Configuración ======================
 
 VENTANA_BUSQUEDA_SIGUIENTES = 12  # líneas a escanear debajo del rótulo
+PAGINAS_ENCABEZADO = 2  # páginas a leer antes de recurrir al PDF completo
+HILOS_COPIA = 4  # copias simultáneas a RUTA_SALIDA (suele ser una carpeta de red)
 
 # Carga robusta del .env (siempre desde la carpeta del script)
 RUTA_PROYECTO = Path(__file__).resolve().parent
@@ -30,61 +38,159 @@ LIMITE_NOMBRE_CLIENTE = int(os.getenv("PDF_CLIENT_NAME_MAXLEN", "80"))
 FORMATO_NOMBRE_ARCHIVO = os.getenv("PDF_FILENAME_FORMAT", "YYYYMMDD_NOMBRE_CLIENTE").upper()
 FORZAR_LAYOUT = (os.getenv("PDF_FORCE_LAYOUT") or "AUTO").upper()  # AUTO | AFIP_MONO | PROV_B
 
+# Caché de (cliente, fecha) entre corridas. La versión sale del propio script:
+# cualquier cambio en las heurísticas (p. ej. tras un git pull) la invalida sola.
+ARCHIVO_CACHE = RUTA_PROYECTO / ".rename_cache.db"
+VERSION_CACHE = hashlib.sha1(Path(__file__).read_bytes()).hexdigest()[:12]
+
 # =================== Extracción de texto ===================
 
-def extraer_texto_pypdf(ruta_pdf: str) -> Optional[str]:
+def paginas_pymupdf(datos: bytes, max_paginas: Optional[int] = None) -> Iterator[Tuple[str, int]]:
+    """
+    (texto, total de páginas del PDF) página por página; cada página se lee
+    recién cuando se la pide.
+    """
+    import pymupdf
+    with pymupdf.open(stream=datos, filetype="pdf") as doc:
+        total = doc.page_count
+        for i in range(total if max_paginas is None else min(max_paginas, total)):
+            yield doc[i].get_text("text"), total
+
+def paginas_pypdf(datos: bytes, max_paginas: Optional[int] = None) -> Iterator[Tuple[str, int]]:
+    from pypdf import PdfReader
+    paginas = PdfReader(io.BytesIO(datos)).pages
+    total = len(paginas)
+    for i in range(total if max_paginas is None else min(max_paginas, total)):
+        yield paginas[i].extract_text() or "", total
+
+def extraer_texto_pymupdf(datos: bytes) -> Optional[str]:
+    try:
+        return "\n".join(texto for texto, _ in paginas_pymupdf(datos))
+    except Exception:
+        return None
+
+def extraer_texto_pypdf(datos: bytes) -> Optional[str]:
     try:
-        from pypdf import PdfReader
-        reader = PdfReader(ruta_pdf)
-        return "\n".join([(p.extract_text() or "") for p in reader.pages])
+        return "\n".join(texto for texto, _ in paginas_pypdf(datos))
     except Exception:
         return None
 
-def extraer_texto_pdfminer(ruta_pdf: str) -> Optional[str]:
+def extraer_texto_pdfminer(datos: bytes) -> Optional[str]:
     try:
         from pdfminer.high_level import extract_text
-        return extract_text(ruta_pdf)
+        return extract_text(io.BytesIO(datos))
     except Exception:
         return None
 
-def extraer_texto(ruta_pdf: str) -> str:
-    texto = extraer_texto_pypdf(ruta_pdf) or extraer_texto_pdfminer(ruta_pdf)
+# Lectores página por página (pase de encabezado) y su versión de PDF completo
+LECTORES_POR_PAGINA = (
+    (paginas_pymupdf, extraer_texto_pymupdf),
+    (paginas_pypdf, extraer_texto_pypdf),
+)
+LECTORES_COMPLETOS = (extraer_texto_pymupdf, extraer_texto_pypdf, extraer_texto_pdfminer)
+
+def extraer_texto(ruta_pdf: str, datos: Optional[bytes] = None,
+                  lectores: Sequence[Callable[[bytes], Optional[str]]] = LECTORES_COMPLETOS,
+                  ) -> Tuple[str, List[str]]:
+    """
+    Extrae el texto del PDF completo con el primer lector de `lectores` que
+    devuelva algo. Los parsers trabajan sobre los bytes en memoria (`datos` o
+    el archivo leído de una vez). Devuelve el texto y sus líneas ya recortadas.
+    """
+    if datos is None:
+        with open(ruta_pdf, "rb") as f:
+            datos = f.read()
+    texto = next(filter(None, (leer(datos) for leer in lectores)), None)
     if not texto:
         raise RuntimeError(f"No se pudo extraer texto de: {ruta_pdf}")
-    texto = texto.replace("\r", "\n")
-    texto = re.sub(r"\n{2,}", "\n", texto)
-    return texto
+    return normalizar_texto(texto)
+
+def normalizar_texto(texto: str) -> Tuple[str, List[str]]:
+    """
+    Unifica saltos de línea y descarta líneas vacías en una sola pasada. Las
+    líneas salen ya recortadas: los extractores no vuelven a hacer strip().
+    """
+    crudas = list(filter(None, texto.replace("\r", "\n").split("\n")))
+    return "\n".join(crudas), [ln.strip() for ln in crudas]
 
 # ================== Patrones / Heurísticas ==================
 
 PATRON_ETIQUETA_INLINE = re.compile(
     r"Apellido\s*y\s*Nombre\s*/\s*Raz[oó]n\s*Social\s*:?\s*(.+)$", re.IGNORECASE)
+# Los patrones *_SOLO describen la línea entera: se usan con fullmatch
 PATRON_ETIQUETA_SOLO = re.compile(
-    r"^Apellido\s*y\s*Nombre\s*/\s*Raz[oó]n\s*Social\s*:?\s*$", re.IGNORECASE)
+    r"Apellido\s*y\s*Nombre\s*/\s*Raz[oó]n\s*Social\s*:?\s*", re.IGNORECASE)
 PATRON_RAZON_INLINE = re.compile(r"Raz[oó]n\s*Social\s*:?\s*(.+)$", re.IGNORECASE)
-PATRON_RAZON_SOLO = re.compile(r"^Raz[oó]n\s*Social\s*:?\s*$", re.IGNORECASE)
+PATRON_RAZON_SOLO = re.compile(r"Raz[oó]n\s*Social\s*:?\s*", re.IGNORECASE)
 
-PATRONES_CORTE = re.compile(
-    r"\b(Domicilio|Condici[oó]n|Punto\s*de\s*Venta|Comprobante|Per[ií]odo|Fecha|CAE|Ingresos\s*Brutos)\b",
-    re.IGNORECASE,
-)
+# Fuentes en minúsculas, compartidas por los patrones que las usan: con
+# IGNORECASE sobre el texto original o tal cual sobre el texto en minúsculas
+FUENTE_CORTE = (
+    r"\b(domicilio|condici[oó]n|punto\s*de\s*venta|comprobante|per[ií]odo|fecha|cae|ingresos\s*brutos)\b")
+FUENTE_DIRECCION = (
+    r"\d|,| - |\b(domicilio|calle|av\.?|avenida|piso|depto|capital|buenos\s*aires|provincia|cp|código\s*postal)\b")
+
+PATRONES_CORTE = re.compile(FUENTE_CORTE, re.IGNORECASE)
 
 SUFIJOS_SOCIALES = re.compile(
     r"\b(S\.?A\.?|S\.?R\.?L\.?|SAS|SAU|SAIC|SAICyF|SAICF|U\.?T\.?E\.?)\b", re.IGNORECASE)
 
-INDICIOS_DIRECCION = re.compile(
-    r"\d|,| - |\b(Domicilio|Calle|Av\.?|Avenida|Piso|Depto|Capital|Buenos\s*Aires|Provincia|CP|Código\s*Postal)\b",
-    re.IGNORECASE,
+# Los patrones que solo se aplican sobre texto ya pasado a minúsculas van sin
+# IGNORECASE: el motor compara carácter a carácter y aprovecha el literal inicial.
+
+# Otra etiqueta o una dirección: descarta una línea candidata a nombre con un
+# solo search (sobre la línea en minúsculas)
+DESCARTE_CANDIDATO = re.compile(f"{FUENTE_CORTE}|{FUENTE_DIRECCION}")
+
+# Fechas rotuladas (sobre el texto en minúsculas): el literal 'fecha' inicial
+# deja saltar rápido el texto. Sin \b final: los extractores suelen pegar el
+# campo siguiente a la fecha ("01/07/2024CAE ...").
+PATRON_FECHA_ROTULADA = re.compile(
+    r"fecha(?P<emision>\s*de\s*emisi[oó]n)?\s*[:\-]?\s*(?P<fecha>\d{2}/\d{2}/\d{4})")
+# Fechas sueltas: sólo se buscan si no apareció ninguna rotulada, primero las
+# de año completo; van por separado para que una dd/mm/aa no tape a una
+# dd/mm/aaaa que se solapa con ella ("11/01/02/2024")
+PATRON_FECHA_LARGA = re.compile(r"\b\d{2}/\d{2}/\d{4}\b")
+PATRON_FECHA_CORTA = re.compile(r"\b\d{2}/\d{2}/\d{2}\b")
+
+# Indicios de factura de proveedor (layout PROV_B). Los que ignoran mayúsculas
+# se buscan en el texto en minúsculas; C.U.I.T. y Nº van tal cual sobre el
+# original. Se aplican al texto entero, así que:
+#   - [^\S\n] (espacio salvo salto de línea) evita armar un indicio entre dos líneas;
+#   - "X(?<!\w.)" equivale a "\bX" pero deja la letra X al frente del patrón,
+#     y el motor salta directo a sus apariciones en vez de probar cada posición.
+PATRON_INDICIOS_B = re.compile(
+    r"(?:c(?<!\w.)(?:omprobantes[^\S\n]+asociados|[oó]digo[^\S\n]*00\d)"
+    r"|f(?<!\w.)actura[^\S\n]+[ab])\b"
 )
+PATRON_INDICIOS_B_EXACTOS = re.compile(
+    r"(?:C(?<!\w.)\.U\.I\.T\.|N(?<!\w.)[º°:][^\S\n]*\d{3,4}-\d{6,8})\b")
+
+# Filtros baratos antes de los patrones de rótulo: la mayoría de las líneas no
+# contiene el rótulo y así no llegan al motor de regex (que es IGNORECASE).
+def tiene_rotulo_afip(s: str) -> bool:
+    return "apellido" in s.lower()
 
-def parece_direccion(s: str) -> bool:
-    return bool(INDICIOS_DIRECCION.search(s))
+def tiene_rotulo_razon(s: str) -> bool:
+    return "raz" in s.lower()
 
 # =================== Utilidades de parsing ===================
 
+LETRAS_NOMBRE = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyzÁÉÍÓÚÑÜáéíóúñü")
+
 def es_nombre_viable(s: str) -> bool:
-    tokens = re.findall(r"[A-Za-zÁÉÍÓÚÑÜáéíóúñü]{2,}", s)
-    return len(tokens) >= 2
+    """Al menos dos palabras de 2+ letras; corta apenas encuentra la segunda."""
+    palabras = corrida = 0
+    for c in s:
+        if c in LETRAS_NOMBRE:
+            corrida += 1
+            if corrida == 2:
+                palabras += 1
+                if palabras == 2:
+                    return True
+        else:
+            corrida = 0
+    return False
 
 def cortar_en_siguientes_etiquetas(s: str) -> str:
     s = s.split("  ")[0].strip()
@@ -94,93 +200,153 @@ def cortar_en_siguientes_etiquetas(s: str) -> str:
 
 # ================== Detección de Layout ==================
 
-def determinar_layout(lineas: List[str]) -> str:
+@dataclass
+class LayoutInfo:
+    """
+    Layout detectado y desde qué línea buscar cada rótulo. Los índices son
+    cotas inferiores: antes de ellos se sabe que el rótulo no aparece.
+    """
+    tipo: str
+    idx_etiqueta_afip: int = 0
+    idx_razon_social: int = 0
+
+def lineas_con(minus: str, sub: str) -> Iterator[int]:
+    """Índices (en orden, sin repetir) de las líneas de `minus` que contienen `sub`."""
+    linea = desde = 0
+    pos = minus.find(sub)
+    while pos >= 0:
+        linea += minus.count("\n", desde, pos)
+        yield linea
+        desde = minus.find("\n", pos)
+        if desde < 0:
+            return
+        pos = minus.find(sub, desde)
+
+def determinar_layout(lineas: List[str]) -> LayoutInfo:
     """
     Reglas:
       - AFIP_MONO: si aparece 'Apellido y Nombre / Razón Social'
       - PROV_B   : si aparece 'Razón Social:' y hay indicios de factura de proveedor
                    (Comprobantes asociados, C.U.I.T., Código 00x, Factura A/B, Nº 0010-...)
       - UNKNOWN  : si no hay señales claras
+    El texto se pasa a minúsculas una vez; str.find ubica las líneas con
+    'apellido'/'raz' (solo esas pasan por los patrones de rótulo) y los
+    indicios se buscan con un único search sobre el texto entero.
     """
     texto = "\n".join(lineas)
+    minus = texto.lower()
 
-    if any(PATRON_ETIQUETA_SOLO.search(ln) or PATRON_ETIQUETA_INLINE.search(ln) for ln in lineas):
-        return "AFIP_MONO"
+    idx_afip = next((i for i in lineas_con(minus, "apellido")
+                     if PATRON_ETIQUETA_SOLO.fullmatch(lineas[i]) or PATRON_ETIQUETA_INLINE.search(lineas[i])),
+                    None)
 
-    conteo_razon = sum(1 for ln in lineas if PATRON_RAZON_INLINE.search(ln) or PATRON_RAZON_SOLO.search(ln))
-    indicios_b = False
-    if conteo_razon:
-        if re.search(r"\bComprobantes\s+asociados\b", texto, re.IGNORECASE):
-            indicios_b = True
-        if re.search(r"\bC\.U\.I\.T\.\b", texto):
-            indicios_b = True
-        if re.search(r"\bC[oó]digo\s*00\d\b", texto, re.IGNORECASE):
-            indicios_b = True
-        if re.search(r"\bFactura\s+[AB]\b", texto, re.IGNORECASE):
-            indicios_b = True
-        if re.search(r"\bN[º°:]\s*\d{3,4}-\d{6,8}\b", texto):
-            indicios_b = True
+    # Alcanza con los dos primeros rótulos 'Razón Social' (antes del AFIP, si lo hay)
+    razones: List[int] = []
+    for i in lineas_con(minus, "raz"):
+        if len(razones) == 2 or (idx_afip is not None and i >= idx_afip):
+            break
+        if PATRON_RAZON_INLINE.search(lineas[i]) or PATRON_RAZON_SOLO.fullmatch(lineas[i]):
+            razones.append(i)
 
-    if indicios_b or conteo_razon >= 2:
-        return "PROV_B"
+    if idx_afip is not None:
+        return LayoutInfo("AFIP_MONO", idx_afip, razones[0] if razones else idx_afip)
 
-    return "UNKNOWN"
+    fin = len(lineas)
+    idx_razon = razones[0] if razones else fin
+    if len(razones) >= 2 or (razones and (PATRON_INDICIOS_B.search(minus)
+                                          or PATRON_INDICIOS_B_EXACTOS.search(texto))):
+        return LayoutInfo("PROV_B", fin, idx_razon)
+
+    return LayoutInfo("UNKNOWN", fin, idx_razon)
 
 # ================== Extractores ==================
 
-def extraer_afip_mono(lineas: List[str]) -> Optional[str]:
-    for idx, ln in enumerate(lineas):
+def buscar_debajo_del_rotulo(lineas: List[str], idx_rotulo: int, exigir_viable: bool) -> Optional[str]:
+    """
+    Primer candidato en las VENTANA_BUSQUEDA_SIGUIENTES líneas debajo de un
+    rótulo solo, salteando vacías, otras etiquetas y direcciones.
+    """
+    fin = min(idx_rotulo + 1 + VENTANA_BUSQUEDA_SIGUIENTES, len(lineas))
+    descartar = DESCARTE_CANDIDATO.search
+    for j in range(idx_rotulo + 1, fin):
+        cand = lineas[j]
+        if not cand or descartar(cand.lower()):
+            continue
+        cand = cortar_en_siguientes_etiquetas(cand)
+        if not exigir_viable or es_nombre_viable(cand):
+            return cand
+    return None
+
+def extraer_afip_mono(lineas: List[str], inicio: int = 0) -> Optional[str]:
+    """
+    Una sola pasada: el rótulo con el nombre en la misma línea gana; los
+    rótulos solos se anotan y solo se miran sus ventanas si no hubo ninguno.
+    """
+    rotulos_solos: List[int] = []
+    for idx in range(inicio, len(lineas)):
+        ln = lineas[idx]
+        if not tiene_rotulo_afip(ln):
+            continue
         m = PATRON_ETIQUETA_INLINE.search(ln)
         if m:
             trozo = cortar_en_siguientes_etiquetas(m.group(1).strip())
             if SUFIJOS_SOCIALES.search(trozo) and es_nombre_viable(trozo):
                 return trozo
-            k, j = 0, idx + 1
-            while k < 2 and j < len(lineas):
-                nxt = lineas[j].strip()
+            partes = [trozo]
+            j = idx + 1
+            while len(partes) < 3 and j < len(lineas):
+                nxt = lineas[j]
                 j += 1
                 if not nxt:
                     continue
-                if PATRONES_CORTE.search(nxt) or parece_direccion(nxt):
+                if DESCARTE_CANDIDATO.search(nxt.lower()):
                     break
                 nxt = cortar_en_siguientes_etiquetas(nxt)
                 if nxt:
-                    trozo = (trozo + " " + nxt).strip()
-                    k += 1
+                    partes.append(nxt)
+            trozo = " ".join(partes).strip()
             if es_nombre_viable(trozo):
                 return trozo
+        if PATRON_ETIQUETA_SOLO.fullmatch(ln):
+            rotulos_solos.append(idx)
 
-    for i, ln in enumerate(lineas):
-        if PATRON_ETIQUETA_SOLO.search(ln):
-            for j in range(i + 1, min(i + 1 + VENTANA_BUSQUEDA_SIGUIENTES, len(lineas))):
-                cand = lineas[j].strip()
-                if not cand or PATRONES_CORTE.search(cand) or parece_direccion(cand):
-                    continue
-                cand = cortar_en_siguientes_etiquetas(cand)
-                if es_nombre_viable(cand):
-                    return cand
+    for i in rotulos_solos:
+        cand = buscar_debajo_del_rotulo(lineas, i, exigir_viable=True)
+        if cand:
+            return cand
     return None
 
-def extraer_razon_social(lineas: List[str]) -> Optional[str]:
-    """Devuelve solo lo que sigue a 'Razón Social:'."""
-    for idx, ln in enumerate(lineas):
+def extraer_razon_social(lineas: List[str], inicio: int = 0) -> Optional[str]:
+    """Devuelve solo lo que sigue a 'Razón Social:' (misma pasada que extraer_afip_mono)."""
+    rotulos_solos: List[int] = []
+    for idx in range(inicio, len(lineas)):
+        ln = lineas[idx]
+        if not tiene_rotulo_razon(ln):
+            continue
         m = PATRON_RAZON_INLINE.search(ln)
         if m:
             return cortar_en_siguientes_etiquetas(m.group(1).strip())
-    for i, ln in enumerate(lineas):
-        if PATRON_RAZON_SOLO.search(ln):
-            for j in range(i + 1, min(i + 1 + VENTANA_BUSQUEDA_SIGUIENTES, len(lineas))):
-                cand = lineas[j].strip()
-                if not cand or PATRONES_CORTE.search(cand) or parece_direccion(cand):
-                    continue
-                return cortar_en_siguientes_etiquetas(cand)
+        if PATRON_RAZON_SOLO.fullmatch(ln):
+            rotulos_solos.append(idx)
+    for i in rotulos_solos:
+        cand = buscar_debajo_del_rotulo(lineas, i, exigir_viable=False)
+        if cand:
+            return cand
     return None
 
 # ================== Detección del cliente ==================
 
-def detectar_nombre_cliente(texto: str, debug: bool = False, layout_forzado: str = "AUTO") -> Optional[str]:
-    lineas = [ln.strip() for ln in texto.split("\n") if ln is not None]
-    layout = determinar_layout(lineas) if layout_forzado == "AUTO" else layout_forzado
+def detectar_nombre_cliente(lineas: List[str], debug: bool = False, layout_forzado: str = "AUTO") -> Optional[str]:
+    if not any(tiene_rotulo_razon(ln) for ln in lineas):
+        # Los dos rótulos contienen "Razón": sin él no hay nada que extraer, y
+        # con los índices al final ningún extractor recorre las líneas
+        fin = len(lineas)
+        info = LayoutInfo("UNKNOWN" if layout_forzado == "AUTO" else layout_forzado, fin, fin)
+    elif layout_forzado == "AUTO":
+        info = determinar_layout(lineas)
+    else:
+        info = LayoutInfo(layout_forzado)
+    layout = info.tipo
 
     if debug:
         print(f"---- DEBUG layout: {layout} ----")
@@ -188,16 +354,18 @@ def detectar_nombre_cliente(texto: str, debug: bool = False, layout_forzado: str
             print(f"{i:02d}: {ln}")
 
     if layout == "AFIP_MONO":
-        nombre = extraer_afip_mono(lineas) or extraer_razon_social(lineas)
+        nombre = (extraer_afip_mono(lineas, info.idx_etiqueta_afip)
+                  or extraer_razon_social(lineas, info.idx_razon_social))
         if nombre and es_nombre_viable(nombre):
             return nombre
     elif layout == "PROV_B":
-        nombre = extraer_razon_social(lineas)
+        nombre = extraer_razon_social(lineas, info.idx_razon_social)
         if nombre:
             return nombre.strip()
         return None
     else:
-        nombre = extraer_afip_mono(lineas) or extraer_razon_social(lineas)
+        nombre = (extraer_afip_mono(lineas, info.idx_etiqueta_afip)
+                  or extraer_razon_social(lineas, info.idx_razon_social))
         if nombre and es_nombre_viable(nombre):
             return nombre
 
@@ -205,33 +373,86 @@ def detectar_nombre_cliente(texto: str, debug: bool = False, layout_forzado: str
 
 # =================== Utilidades de nombres/archivos ===================
 
+# unidecode deja solo ASCII: basta una tabla de 128 caracteres para borrar
+# lo que no sea [\w\s\-\.\&] con un único str.translate
+TABLA_CARACTERES_INVALIDOS = str.maketrans("", "", "".join(
+    chr(c) for c in range(128) if re.fullmatch(r"[^\w\s\-\.\&]", chr(c))))
+
+@lru_cache(maxsize=512)  # los lotes suelen repetir los mismos pocos clientes
 def sanear_para_nombre_archivo(nombre: str, largo_max: int = 80) -> str:
-    nombre = unidecode(nombre)
-    nombre = re.sub(r"[^\w\s\-\.\&]", "", nombre)
-    nombre = re.sub(r"\s+", " ", nombre).strip()
+    nombre = unidecode(nombre).translate(TABLA_CARACTERES_INVALIDOS)
+    nombre = " ".join(nombre.split())
     return nombre[:largo_max].strip(" ._-")
 
-def detectar_fecha_emision(texto: str) -> Optional[str]:
-    patrones = [
-        re.compile(r"Fecha\s*[:\-]?\s*(\d{2}/\d{2}/\d{4})", re.IGNORECASE),
-        re.compile(r"Fecha\s*de\s*Emisi[oó]n\s*[:\-]?\s*(\d{2}/\d{2}/\d{4})", re.IGNORECASE),
-        re.compile(r"\b(\d{2}/\d{2}/\d{4})\b"),
-        re.compile(r"\b(\d{2}/\d{2}/\d{2})\b"),
-    ]
-    for patron in patrones:
-        m = patron.search(texto)
-        if m:
-            fecha = m.group(1)
-            partes = fecha.split("/")
-            if len(partes[-1]) == 2:
-                partes[-1] = "20" + partes[-1]
-            return "".join(reversed(partes))
-    return None
+def normalizar_fecha(fecha: str) -> str:
+    partes = fecha.split("/")
+    if len(partes[-1]) == 2:
+        partes[-1] = "20" + partes[-1]
+    return "".join(reversed(partes))
 
-def renombrar_pdf(ruta_pdf: str, simulacion: bool = True, debug: bool = False) -> str:
-    texto = extraer_texto(ruta_pdf)
-    cliente = detectar_nombre_cliente(texto, debug=debug, layout_forzado=FORZAR_LAYOUT)
+def detectar_fecha_emision(texto: str) -> Optional[str]:
+    """
+    Preferencia: 'Fecha: dd/mm/aaaa', 'Fecha de Emisión: dd/mm/aaaa',
+    cualquier dd/mm/aaaa y por último cualquier dd/mm/aa.
+    """
+    emision = None
+    # Los dígitos de la fecha no cambian al pasar a minúsculas
+    for m in PATRON_FECHA_ROTULADA.finditer(texto.lower()):
+        if not m.group("emision"):
+            return normalizar_fecha(m.group("fecha"))
+        emision = emision or m.group("fecha")
+    if emision:
+        return normalizar_fecha(emision)
+
+    m = PATRON_FECHA_LARGA.search(texto) or PATRON_FECHA_CORTA.search(texto)
+    return normalizar_fecha(m.group()) if m else None
+
+def detectar_cliente_y_fecha(ruta_pdf: str, debug: bool = False,
+                             layout_forzado: str = FORZAR_LAYOUT) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Cliente y fecha están en el encabezado: se leen las primeras
+    PAGINAS_ENCABEZADO páginas de a una, cortando apenas aparecen los dos, y
+    solo si falta alguno se pasa al PDF completo.
+    """
+    with open(ruta_pdf, "rb") as f:
+        datos = f.read()
+
+    # El volcado de --debug sale una sola vez, del pase cuyo resultado se devuelve
+    sin_abrir = set()
+    for paginas, _ in LECTORES_POR_PAGINA:
+        leidas: List[str] = []
+        total = 0
+        encontrados = False
+        try:
+            for pagina, total in paginas(datos, PAGINAS_ENCABEZADO):
+                leidas.append(pagina)
+                texto, lineas = normalizar_texto("\n".join(leidas))
+                cliente = detectar_nombre_cliente(lineas, layout_forzado=layout_forzado)
+                fecha = detectar_fecha_emision(texto)
+                if cliente and fecha:
+                    encontrados = True
+                    break
+        except Exception:
+            if not leidas:
+                sin_abrir.add(paginas)
+                continue  # este backend no pudo abrir el PDF: probar el siguiente
+            break
+        # Si ya se leyeron todas las páginas, releer el PDF completo daría lo mismo
+        if encontrados or (leidas and len(leidas) >= total and texto):
+            if debug:
+                detectar_nombre_cliente(lineas, debug=True, layout_forzado=layout_forzado)
+            return cliente, fecha
+        break
+
+    # En el pase completo no se repiten los lectores que ni abrieron el PDF
+    lectores = [completo for paginas, completo in LECTORES_POR_PAGINA if paginas not in sin_abrir]
+    texto, lineas = extraer_texto(ruta_pdf, datos=datos, lectores=lectores + [extraer_texto_pdfminer])
+    cliente = detectar_nombre_cliente(lineas, debug=debug, layout_forzado=layout_forzado)
     fecha = detectar_fecha_emision(texto)
+    return cliente, fecha
+
+def armar_nuevo_nombre(ruta_pdf: str, cliente: Optional[str], fecha: Optional[str]) -> str:
+    """Arma el nombre de destino a partir de lo detectado (sin resolver colisiones)."""
     if not cliente:
         raise ValueError("No se encontró el nombre del cliente en el PDF.")
     if not fecha:
@@ -246,23 +467,219 @@ def renombrar_pdf(ruta_pdf: str, simulacion: bool = True, debug: bool = False) -
         nuevo_nombre = f"{cliente_saneado}_{fecha}_{base_original}.pdf"
     else:
         nuevo_nombre = f"{fecha}_{cliente_saneado}_{base_original}.pdf"
+    return nuevo_nombre
+
+def listar_salida() -> Set[str]:
+    """Nombres ya presentes en RUTA_SALIDA, en minúsculas (Windows/macOS no distinguen)."""
+    return {nombre.lower() for nombre in os.listdir(RUTA_SALIDA)}
+
+# Parte del nombre renombrado anterior a "_<base original>" (según FORMATO_NOMBRE_ARCHIVO)
+PATRON_PREFIJO_RENOMBRADO = re.compile(r"(?:\d{8}|SINFECHA)_.*|.*_(?:\d{8}|SINFECHA)")
+PATRON_SUFIJO_COLISION = re.compile(r"\(\d+\)$")
+
+def indexar_procesados() -> Dict[str, List[str]]:
+    """
+    Indexa los PDF de RUTA_SALIDA por cada posible "_<base original>" (en
+    minúsculas), para reconocer los originales ya procesados sin leerlos.
+    Como el cliente también lleva "_", un final puede corresponder a varios
+    PDF de otros originales: se guardan todos y buscar_procesado confirma.
+    """
+    nombres = []
+    for nombre in os.listdir(RUTA_SALIDA):
+        raiz, ext = os.path.splitext(nombre)
+        if ext.lower() != ".pdf":
+            continue
+        sin_sufijo = PATRON_SUFIJO_COLISION.sub("", raiz)
+        nombres.append((sin_sufijo != raiz, nombre, sin_sufijo))
+
+    indice: Dict[str, List[str]] = {}
+    for _, nombre, raiz in sorted(nombres):  # cada copia antes que sus "(2)", "(3)"...
+        for i, c in enumerate(raiz):
+            if c == "_" and PATRON_PREFIJO_RENOMBRADO.fullmatch(raiz[:i]):
+                indice.setdefault(raiz[i:].lower(), []).append(nombre)
+    return indice
+
+def buscar_procesado(ruta_pdf: str, procesados: Dict[str, List[str]]) -> Optional[str]:
+    """Copia renombrada de `ruta_pdf`: copy2 conserva tamaño y fecha de modificación."""
+    base_original = os.path.splitext(os.path.basename(ruta_pdf))[0]
+    candidatos = procesados.get(f"_{base_original}".lower())
+    if not candidatos:
+        return None
+    try:
+        origen = os.stat(ruta_pdf)
+    except OSError:
+        return None  # el error se informa al procesarlo
+    for nombre in candidatos:
+        try:
+            copia = os.stat(os.path.join(RUTA_SALIDA, nombre))
+        except OSError:
+            continue
+        # Tolerancia de 2 s: FAT y algunos recursos de red redondean la fecha
+        if copia.st_size == origen.st_size and abs(copia.st_mtime - origen.st_mtime) < 2:
+            return nombre
+    return None
+
+def abrir_cache() -> MutableMapping:
+    """Abre la caché en disco; si no se puede, sigue con una en memoria."""
+    try:
+        return shelve.open(str(ARCHIVO_CACHE))
+    except Exception as e:
+        print(f"⚠️ No se pudo abrir la caché ({e}); se leerán todos los PDF")
+        return {}
+
+def clave_cache(ruta_pdf: str, layout: str) -> Optional[str]:
+    """
+    Un PDF modificado (tamaño o mtime) o leído con otro layout es otra entrada.
+    None si no se puede leer: el PDF se procesa sin caché y el error sale ahí.
+    """
+    try:
+        st = os.stat(ruta_pdf)
+    except OSError:
+        return None
+    return f"{VERSION_CACHE}|{os.path.abspath(ruta_pdf)}|{st.st_size}|{st.st_mtime_ns}|{layout}"
 
-    destino_final = os.path.join(RUTA_SALIDA, nuevo_nombre)
+def leer_cache(cache: MutableMapping, clave: Optional[str]) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """
+    (cliente, fecha) guardados para `clave`, o None si no hay. Una entrada
+    ilegible (corrida interrumpida; dbm.dumb no bloquea) se borra y el PDF se
+    vuelve a leer como cualquier otro.
+    """
+    if clave is None:
+        return None
+    try:
+        return cache.get(clave)
+    except Exception:
+        try:
+            del cache[clave]
+        except Exception:
+            pass
+        return None
+
+def reservar_nombre(nuevo_nombre: str, existentes: Set[str]) -> str:
+    """Primer nombre libre ("x.pdf", "x(2).pdf", ...) y lo marca como usado."""
+    nombre_final = nuevo_nombre
     i = 2
-    base_sin_ext, ext = os.path.splitext(destino_final)
-    while os.path.exists(destino_final):
-        destino_final = f"{base_sin_ext}({i}){ext}"
+    base_sin_ext, ext = os.path.splitext(nuevo_nombre)
+    while nombre_final.lower() in existentes:
+        nombre_final = f"{base_sin_ext}({i}){ext}"
         i += 1
+    existentes.add(nombre_final.lower())
+    return nombre_final
+
+def copiar_con_nombre(ruta_pdf: str, nuevo_nombre: str, simulacion: bool = True,
+                      existentes: Optional[Set[str]] = None,
+                      copias: Optional[Executor] = None) -> Tuple[str, Optional[Future]]:
+    """
+    Resuelve colisiones contra `existentes` (ver listar_salida) y copia.
+    El nombre elegido se agrega al conjunto también en simulación, así el
+    DRY-RUN muestra los mismos sufijos que --apply. Debe correr en un único proceso.
+    Con `copias`, la copia se encarga a ese executor y se devuelve su Future
+    (el mensaje vale recién cuando termina); sin él, se copia acá mismo.
+    """
+    if existentes is None:
+        existentes = listar_salida()
+    nombre_final = reservar_nombre(nuevo_nombre, existentes)
 
     if simulacion:
-        return f"[DRY-RUN] {os.path.basename(ruta_pdf)} -> {os.path.basename(destino_final)}"
+        return f"[DRY-RUN] {os.path.basename(ruta_pdf)} -> {nombre_final}", None
+
+    destino = os.path.join(RUTA_SALIDA, nombre_final)
+    copia = copias.submit(shutil.copy2, ruta_pdf, destino) if copias else None
+    if copia is None:
+        shutil.copy2(ruta_pdf, destino)
+    return f"✅ Copiado: {os.path.basename(ruta_pdf)} -> {nombre_final}", copia
+
+def renombrar_pdf(ruta_pdf: str, simulacion: bool = True, debug: bool = False,
+                  existentes: Optional[Set[str]] = None, layout_forzado: str = FORZAR_LAYOUT) -> str:
+    cliente, fecha = detectar_cliente_y_fecha(ruta_pdf, debug=debug, layout_forzado=layout_forzado)
+    nuevo_nombre = armar_nuevo_nombre(ruta_pdf, cliente, fecha)
+    mensaje, _ = copiar_con_nombre(ruta_pdf, nuevo_nombre, simulacion=simulacion, existentes=existentes)
+    return mensaje
+
+def mensaje_previo(ruta_pdf: str, previo: str, existentes: Set[str]) -> str:
+    """
+    Simulación de un PDF que ya tiene copia renombrada (`previo`), sin leerlo:
+    --apply lo vuelve a copiar con el mismo nombre base, así que se reserva el
+    próximo "(n)" igual que lo haría y el DRY-RUN sigue anticipando --apply.
+    """
+    raiz, ext = os.path.splitext(previo)
+    nuevo_nombre = PATRON_SUFIJO_COLISION.sub("", raiz) + ext
+    mensaje, _ = copiar_con_nombre(ruta_pdf, nuevo_nombre, simulacion=True, existentes=existentes)
+    return f"{mensaje} (ya procesado como {previo}; no se leyó el PDF)"
+
+def procesar_lote(archivos: List[str], previos: Dict[str, Optional[str]], existentes: Set[str],
+                  simulacion: bool, layout: str, usar_cache: bool) -> None:
+    """
+    Los workers solo leen los PDF y devuelven (cliente, fecha); el nombre y
+    las colisiones se resuelven acá, en orden, para que dos PDF no reciban el
+    mismo "(2)". Las copias van a hilos: son E/S y se superponen con la lectura
+    de los siguientes. Los mensajes salen en el orden de `archivos`.
+    """
+    # (ruta, copia pendiente o None, mensaje): el de una copia espera a que termine
+    salida: Deque[Tuple[str, Optional[Future], str]] = deque()
+
+    def informar(bloquear: bool) -> None:
+        while salida and (bloquear or salida[0][1] is None or salida[0][1].done()):
+            ruta_pdf, copia, mensaje = salida.popleft()
+            try:
+                if copia is not None:
+                    copia.result()
+            except Exception as e:
+                mensaje = f"❌ {os.path.basename(ruta_pdf)}: {e}"
+            print(mensaje)
 
-    shutil.copy2(ruta_pdf, destino_final)
-    return f"✅ Copiado: {os.path.basename(ruta_pdf)} -> {os.path.basename(destino_final)}"
+    # Los PDF sin cambios desde la corrida anterior salen de la caché sin leerse
+    cache = abrir_cache() if usar_cache else {}
+    ex: Optional[ProcessPoolExecutor] = None
+    copias = ThreadPoolExecutor(max_workers=HILOS_COPIA)
+    try:
+        pendientes = [ruta_pdf for ruta_pdf in archivos if not previos[ruta_pdf]]
+        claves = {ruta_pdf: clave_cache(ruta_pdf, layout) for ruta_pdf in pendientes}
+        guardados = {ruta_pdf: leer_cache(cache, claves[ruta_pdf]) for ruta_pdf in pendientes}
+        a_leer = [ruta_pdf for ruta_pdf in pendientes if guardados[ruta_pdf] is None]
+
+        # Con un solo PDF por leer no vale la pena el pool
+        futuros = {}
+        if len(a_leer) > 1:
+            ex = ProcessPoolExecutor(max_workers=os.cpu_count())
+            futuros = {ruta_pdf: ex.submit(detectar_cliente_y_fecha, ruta_pdf, False, layout)
+                       for ruta_pdf in a_leer}
+        for ruta_pdf in archivos:
+            previo = previos[ruta_pdf]
+            if previo:
+                salida.append((ruta_pdf, None, mensaje_previo(ruta_pdf, previo, existentes)))
+                informar(bloquear=False)
+                continue
+            try:
+                clave = claves[ruta_pdf]
+                guardado = guardados[ruta_pdf]
+                if guardado is not None:
+                    cliente, fecha = guardado
+                else:
+                    if ex:
+                        cliente, fecha = futuros[ruta_pdf].result()
+                    else:
+                        cliente, fecha = detectar_cliente_y_fecha(ruta_pdf, False, layout)
+                    if clave is not None:
+                        cache[clave] = (cliente, fecha)
+                nuevo_nombre = armar_nuevo_nombre(ruta_pdf, cliente, fecha)
+                mensaje, copia = copiar_con_nombre(ruta_pdf, nuevo_nombre, simulacion=simulacion,
+                                                   existentes=existentes, copias=copias)
+                salida.append((ruta_pdf, copia, mensaje))
+            except Exception as e:
+                salida.append((ruta_pdf, None, f"❌ {os.path.basename(ruta_pdf)}: {e}"))
+            informar(bloquear=False)
+        informar(bloquear=True)
+    finally:
+        copias.shutdown()
+        if ex:
+            ex.shutdown()
+        if isinstance(cache, shelve.Shelf):
+            cache.close()
 
 # ============================= CLI =============================
 
-def main():
+def main() -> None:
     import argparse
 
     parser = argparse.ArgumentParser(description="Renombra facturas PDF agregando el nombre del cliente (AFIP/Proveedor).")
@@ -272,6 +689,7 @@ def main():
     parser.add_argument("--debug", "--depurar", dest="debug", action="store_true")
     parser.add_argument("--layout", "--formato", dest="layout",
                         choices=["AUTO", "AFIP_MONO", "PROV_B"], default=FORZAR_LAYOUT)
+    parser.add_argument("--no-cache", "--sin-cache", dest="no_cache", action="store_true")
 
     args = parser.parse_args()
     ruta = os.path.abspath(args.path)
@@ -280,13 +698,10 @@ def main():
         print(f"❌ Ruta inválida o inexistente: {ruta}")
         sys.exit(2)
 
-    # ⬇️ REEMPLAZÁ ESTA PARTE POR ESTE BLOQUE ⬇️
-    archivos: List[str] = []
+    # Una sola pasada con os.scandir: sin el doble glob *.pdf / *.PDF, que en
+    # sistemas de archivos sin distinción de mayúsculas duplicaba cada PDF
     with os.scandir(ruta) as it:
-        for entry in it:
-            if entry.is_file() and entry.name.lower().endswith(".pdf"):
-                archivos.append(entry.path)
-    # ⬆️ ACÁ ESTÁ LA SOLUCIÓN AL PROBLEMA DE DUPLICADOS ⬆️
+        archivos: List[str] = [e.path for e in it if e.is_file() and e.name.lower().endswith(".pdf")]
 
     if not archivos:
         print(f"No se encontraron archivos PDF en {ruta}")
@@ -295,12 +710,30 @@ def main():
     print(f"📂 Procesando {len(archivos)} archivos desde: {ruta}")
     print(f"📦 Archivos renombrados se guardarán en: {RUTA_SALIDA}")
 
-    for ruta_pdf in archivos:
-        try:
-            mensaje = renombrar_pdf(ruta_pdf, simulacion=not args.apply, debug=args.debug)
-            print(mensaje)
-        except Exception as e:
-            print(f"❌ {os.path.basename(ruta_pdf)}: {e}")
+    existentes = listar_salida()
+
+    # En simulación, los PDF que ya tienen copia renombrada no se vuelven a leer:
+    # se anticipa la copia "(n)" que haría --apply a partir del nombre existente
+    procesados = indexar_procesados() if not args.apply else {}
+    previos = {ruta_pdf: buscar_procesado(ruta_pdf, procesados) for ruta_pdf in archivos}
+
+    # Con --debug se procesa en serie para no mezclar los volcados de cada PDF
+    # (y sin caché, para que el volcado salga siempre)
+    if args.debug:
+        for ruta_pdf in archivos:
+            if previos[ruta_pdf]:
+                print(mensaje_previo(ruta_pdf, previos[ruta_pdf], existentes))
+                continue
+            try:
+                mensaje = renombrar_pdf(ruta_pdf, simulacion=not args.apply, debug=args.debug,
+                                        existentes=existentes, layout_forzado=args.layout)
+                print(mensaje)
+            except Exception as e:
+                print(f"❌ {os.path.basename(ruta_pdf)}: {e}")
+        return
+
+    procesar_lote(archivos, previos, existentes, simulacion=not args.apply,
+                  layout=args.layout, usar_cache=not args.no_cache)
 
 
 if __name__ == "__main__":